@@ -1,34 +1,89 @@
 import argparse
 import asyncio
-import json
 import os
-from dataclasses import asdict
-from datetime import datetime, timedelta
+import time
+from bisect import bisect_right
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional
 
+import diskcache
+import httpx
+import orjson
 import pandas as pd
-import pause
-import plotly.graph_objects as go
 import telegram
-import urllib3
 from croniter import croniter
 from loguru import logger
 from model.stats import WeatherData, WeatherStats
-from plotting.plots import plot_weather
+from plotting.plots import render_weather
+from telegram.constants import MessageLimit
+from telegram.request import HTTPXRequest
 
+# weatherapi.com refreshes roughly every 10-15min, so don't ask it again sooner
+FORECAST_CACHE_TTL_S = 600
+FORECAST_CACHE_MAX_SIZE = 64
+# On-disk copies outlive restarts; keys are bucketed by UTC hour
+FORECAST_DISK_CACHE_TTL_S = 900
+# Sends from concurrent ZIPs queue for a pooled connection instead of failing
+TELEGRAM_POOL_TIMEOUT_S = 30.0
+_forecast_cache: dict[tuple[str, str, int], tuple[float, WeatherData]] = {}
+# Shared client, so keep-alive connections survive across cron ticks and
+# concurrent ZIPs fetch in parallel
+_http = httpx.AsyncClient(
+    base_url="https://api.weatherapi.com/v1",
+    headers={"Content-Type": "application/json"},
+    transport=httpx.AsyncHTTPTransport(retries=10),
+    timeout=10,
+)
 
-def get_forecast(key: str, zip_code: str, days: int = 2) -> Optional[WeatherData]:
+
+@cache
+def _disk_cache(cache_dir: Path) -> diskcache.Cache:
+    return diskcache.Cache(str(cache_dir))
+
+
+async def get_forecast(
+    key: str, zip_code: str, days: int = 2, cache_dir: Optional[Path] = None
+) -> Optional[WeatherData]:
+    zip_code = zip_code.strip().upper()
+    cache_key = (key, zip_code, days)
+    cached = _forecast_cache.get(cache_key)
+    if cached and time.monotonic() - cached[0] < FORECAST_CACHE_TTL_S:
+        logger.debug(f"Using cached forecast for {zip_code}")
+        return cached[1]
+    disk_key = f"{zip_code}:{days}:{datetime.now(timezone.utc).strftime('%Y%m%d%H')}"
     try:
-        url = f"https://api.weatherapi.com/v1/forecast.json?q={zip_code}&days={days}&key={key}"
-        headers = {"Content-Type": "application/json"}
-        resp = urllib3.request("GET", url, retries=10, timeout=10, headers=headers)
-        if resp.status != 200:
-            raise ValueError(f"Bad status code {resp.status}: {resp.data}")
-        return resp.json()
+        # diskcache is blocking SQLite I/O (including opening it), so keep it
+        # off the event loop
+        disk = await asyncio.to_thread(_disk_cache, cache_dir) if cache_dir else None
+        body = None
+        if disk is not None:
+            body = await asyncio.to_thread(disk.get, disk_key)
+        if body is not None:
+            logger.debug(f"Using on-disk forecast for {zip_code}")
+        else:
+            resp = await _http.get(
+                "/forecast.json", params={"q": zip_code, "days": days, "key": key}
+            )
+            if resp.status_code != 200:
+                raise ValueError(f"Bad status code {resp.status_code}: {resp.content}")
+            body = resp.content
+            if disk is not None:
+                await asyncio.to_thread(
+                    disk.set, disk_key, body, expire=FORECAST_DISK_CACHE_TTL_S
+                )
+        data = orjson.loads(body)
     except Exception as e:
         logger.error(f"Failed to get forecast: {e}")
         return None
+    # Only successful responses are cached
+    if len(_forecast_cache) >= FORECAST_CACHE_MAX_SIZE:
+        _forecast_cache.pop(next(iter(_forecast_cache)))
+    _forecast_cache[cache_key] = (time.monotonic(), data)
+    return data
 
 
 def parse_forecast(raw: WeatherData, max_hrs: int) -> pd.DataFrame:
@@ -41,90 +96,123 @@ def parse_forecast(raw: WeatherData, max_hrs: int) -> pd.DataFrame:
     Returns:
         pd.DataFrame: DF
     """
-    forecast_days = raw["forecast"]["forecastday"]
-    dfs = []
-    for day in forecast_days:
-        df = pd.DataFrame(day["hour"])
-        # Sunset/Sunrise
-        cur_dt = datetime.strptime(day["date"], "%Y-%m-%d")
-        sunrise = datetime.strptime(day["astro"]["sunrise"], "%I:%M %p").replace(
-            year=cur_dt.year, month=cur_dt.month, day=cur_dt.day
+    # Cut to the cutoff and max_hrs before building the frame. Hours come
+    # sorted and API times are zero-padded "%Y-%m-%d %H:%M", so plain string
+    # comparison is chronological and each day can be bisected.
+    cutoff = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    days = raw["forecast"]["forecastday"]
+    hours: list[WeatherData] = []
+    hrs_per_day = []
+    remaining = max_hrs
+    for day in days:
+        end = bisect_right(day["hour"], cutoff, key=itemgetter("time"))
+        end = min(end, remaining)
+        hours.extend(day["hour"][:end])
+        hrs_per_day.append(end)
+        remaining -= end
+    # Built column by column in one go; no per-row dtype inference
+    hourly = pd.DataFrame({k: [h[k] for h in hours] for k in hours[0]})
+    # Sunset/Sunrise; parsed once per day, then repeated for each of its hours
+    for col in ["sunrise", "sunset"]:
+        per_day = pd.to_datetime(
+            [f"{day['date']} {day['astro'][col]}" for day in days],
+            format="%Y-%m-%d %I:%M %p",
         )
-        sunset = datetime.strptime(day["astro"]["sunset"], "%I:%M %p").replace(
-            year=cur_dt.year, month=cur_dt.month, day=cur_dt.day
-        )
-        df["sunrise"] = sunrise
-        df["sunset"] = sunset
-        dfs.append(df)
+        hourly[col] = per_day.repeat(hrs_per_day)
+    # Time; the API already returns hours in order
+    hourly["time"] = pd.to_datetime(hourly["time"], format="%Y-%m-%d %H:%M")
+    return hourly
+
 
-    hourly = pd.concat(dfs)
-    # Time
-    now = datetime.now()
-    hourly["time"] = pd.to_datetime(hourly["time"])
-    hourly = hourly.sort_values(by=["time"])
-    hourly = hourly.loc[hourly["time"] <= now + timedelta(days=1)]
-    return hourly.reset_index().iloc[0:max_hrs]
+def cache_img(png: bytes, now: str, zip_code: str, out_path: Path) -> None:
+    img_path = out_path / f"{now}_{zip_code}_weather.png"
+    img_path.write_bytes(png)
 
 
 def cache_all(
-    st: WeatherStats, df: pd.DataFrame, fig: go.Figure, now: str, out_path: Path
+    st: WeatherStats, df: pd.DataFrame, now: str, zip_code: str, out_path: Path
 ) -> None:
-    # Img
-    img_path = out_path / f"{now}_weather.png"
-    fig.write_image(img_path)
     # Data
-    data_path = out_path / f"{now}_weather.parquet"
-    df.to_parquet(data_path)
+    data_path = out_path / f"{now}_{zip_code}_weather.parquet"
+    df.to_parquet(
+        data_path,
+        engine="pyarrow",
+        compression="zstd",
+        compression_level=1,
+        # Forecasts are a few dozen rows, so one row group is plenty
+        row_group_size=max(1, len(df)),
+        index=False,
+    )
     # Stats
-    stats_path = out_path / f"{now}_weather_stats.json"
-    with open(stats_path, "w") as f:
-        f.write(json.dumps(asdict(st), indent=4, sort_keys=True, default=str))
-
-
-async def send_photo_to_bot(bot: telegram.Bot, chat_id: int, img_path: Path):
-    async with bot:
-        await bot.send_photo(chat_id=chat_id, photo=open(img_path, "rb"))  # type: ignore
+    stats_path = out_path / f"{now}_{zip_code}_weather_stats.json"
+    stats_path.write_bytes(
+        orjson.dumps(
+            st,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY,
+            default=str,
+        )
+    )
 
 
-async def send_msg_to_bot(bot: telegram.Bot, chat_id: int, msg: str):
-    async with bot:
+async def send_report_to_bot(
+    bot: telegram.Bot, chat_id: int, msg: str, photo: Optional[bytes]
+):
+    if photo is None:
+        await bot.send_message(text=msg, chat_id=chat_id)  # type: ignore
+    elif len(msg) <= MessageLimit.CAPTION_LENGTH:
+        await bot.send_photo(chat_id=chat_id, photo=photo, caption=msg)  # type: ignore
+    else:
         await bot.send_message(text=msg, chat_id=chat_id)  # type: ignore
+        await bot.send_photo(chat_id=chat_id, photo=photo)  # type: ignore
 
 
 async def run(
-    telegram_token: str,
+    bot: telegram.Bot,
     weather_api_key: str,
     chat_id: int,
     zip_code: str,
     out_dir: Path,
     skip_telegram: bool = False,
+    skip_plot: bool = False,
 ):
-    # Paths
-    out_dir.mkdir(parents=True, exist_ok=True)
     now = datetime.now().isoformat()
-    # Telegram
-    bot = telegram.Bot(telegram_token)
     # Get data
-    raw = get_forecast(weather_api_key, zip_code=zip_code)
+    raw = await get_forecast(
+        weather_api_key, zip_code=zip_code, cache_dir=out_dir / "api_cache"
+    )
     if not raw:
         logger.warning("Failed to get forecast")
         return
     # Parse
     hourly = parse_forecast(raw, max_hrs=48)
     stats = WeatherStats.apply(hourly, raw, zip_code)
-    msgs = stats.build_msgs()
-    logger.info(msgs)
-    # Build image
-    img_path = out_dir / f"{now}_weather.png"
-    fig = plot_weather(hourly, stats)
-    cache_all(stats, hourly, fig, now, out_dir)
+    msg = stats.build_msgs()
+    logger.info(msg)
+    # Rendering and disk writes block, so keep them off the event loop.
+    # Data is cached while the chart renders.
+    pending = [
+        asyncio.create_task(
+            asyncio.to_thread(cache_all, stats, hourly, now, zip_code, out_dir)
+        )
+    ]
+    # Build image; rendered once, cached and sent from the same buffer
+    png = None
+    if not skip_plot:
+        try:
+            png = await asyncio.to_thread(render_weather, hourly, stats)
+            pending.append(asyncio.to_thread(cache_img, png, now, zip_code, out_dir))
+        except Exception as e:
+            # Still cache the data and send the text report
+            logger.opt(exception=e).error(f"Failed to render chart for {zip_code}")
+    else:
+        logger.warning("Skipping plot")
     # send msg
     if not skip_telegram:
         logger.info(f"Sending to chat id {chat_id}..")
-        await send_msg_to_bot(bot, chat_id, "\n".join(msgs))
-        await send_photo_to_bot(bot, chat_id, img_path)
+        pending.append(send_report_to_bot(bot, chat_id, msg, png))
     else:
         logger.warning("Skipping telegram")
+    await asyncio.gather(*pending)
 
 
 async def main():
@@ -133,7 +221,13 @@ async def main():
         "-c", "--chat", help="Chat ID", required=True, type=int, dest="chat_id"
     )
     parser.add_argument(
-        "-z", "--zip", help="ZIP", required=True, type=str, dest="zip_code"
+        "-z",
+        "--zip",
+        help="ZIP(s)",
+        required=True,
+        type=str,
+        nargs="+",
+        dest="zip_codes",
     )
     parser.add_argument(
         "-s", "--cron", help="Crontab schedule", required=True, type=str, dest="cron"
@@ -151,6 +245,13 @@ async def main():
         action="store_true",
         dest="skip_telegram",
     )
+    parser.add_argument(
+        "--no-plot",
+        help="Skip rendering the chart",
+        required=False,
+        action="store_true",
+        dest="skip_plot",
+    )
     args = vars(parser.parse_args())
 
     weather_api_key = os.getenv("WEATHER_API_KEY")
@@ -160,25 +261,57 @@ async def main():
     if not telegram_token:
         raise ValueError("TELEGRAM_TOKEN not set")
 
-    iter = croniter(args["cron"], datetime.now())
-    while True:
-        dt = iter.get_next(datetime)
-        if not args["force"]:
-            logger.info(f"Next run at {dt} for {args['zip_code']}")
-            pause.until(dt)
-        else:
-            logger.warning("Force mode, skipping cron")
-        logger.info("Running...")
-        await run(
-            weather_api_key=weather_api_key,
-            telegram_token=telegram_token,
-            chat_id=args["chat_id"],
-            zip_code=args["zip_code"],
-            skip_telegram=args["skip_telegram"],
-            out_dir=Path(args["out_dir"]),
-        )
-        if args["force"]:
-            break
+    # Created once; every run writes below it
+    out_dir = Path(args["out_dir"])
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # One bot and HTTP session for the lifetime of the process, shared by all runs
+    # One connection per ZIP, since every run sends at the same time
+    bot = telegram.Bot(
+        telegram_token,
+        request=HTTPXRequest(
+            connection_pool_size=len(args["zip_codes"]),
+            pool_timeout=TELEGRAM_POOL_TIMEOUT_S,
+        ),
+    )
+    async with AsyncExitStack() as stack:
+        stack.push_async_callback(_http.aclose)
+        if not args["skip_telegram"]:
+            await stack.enter_async_context(bot)
+        iter = croniter(args["cron"], datetime.now())
+        while True:
+            now = datetime.now()
+            dt = iter.get_next(datetime)
+            if not args["force"]:
+                delay = max(0.0, (dt - now).total_seconds())
+                logger.info(
+                    f"Next run at {dt} (in {timedelta(seconds=int(delay))}) for {', '.join(args['zip_codes'])}"
+                )
+                await asyncio.sleep(delay)
+            else:
+                logger.warning("Force mode, skipping cron")
+            logger.info("Running...")
+            # A failing ZIP is logged, but must not take the others or the loop down
+            results = await asyncio.gather(
+                *(
+                    run(
+                        weather_api_key=weather_api_key,
+                        bot=bot,
+                        chat_id=args["chat_id"],
+                        zip_code=zip_code,
+                        skip_telegram=args["skip_telegram"],
+                        skip_plot=args["skip_plot"],
+                        out_dir=out_dir,
+                    )
+                    for zip_code in args["zip_codes"]
+                ),
+                return_exceptions=True,
+            )
+            for zip_code, res in zip(args["zip_codes"], results):
+                if isinstance(res, Exception):
+                    logger.opt(exception=res).error(f"Run for {zip_code} failed")
+            if args["force"]:
+                break
 
 
 if __name__ == "__main__":
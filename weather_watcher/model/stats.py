@@ -1,16 +1,33 @@
 from abc import ABC, abstractmethod
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, NamedTuple, Optional
 
+import numpy as np
 import pandas as pd
-from overrides import overrides
 from utils import time_to_str
 
 WeatherData = dict[str, Any]
 
 
-@dataclass
+class HourlyColumns(NamedTuple):
+    """ndarray views of the hourly frame, pulled out once and shared by all stats"""
+
+    time: np.ndarray
+    temp_f: np.ndarray
+    feelslike_f: np.ndarray
+    humidity: np.ndarray
+    precip_mm: np.ndarray
+    wind_mph: np.ndarray
+    sunrise: np.ndarray
+    sunset: np.ndarray
+
+    @staticmethod
+    def from_df(df: pd.DataFrame) -> "HourlyColumns":
+        return HourlyColumns(*(df[c].to_numpy() for c in HourlyColumns._fields))
+
+
+@dataclass(slots=True)
 class Location:
     zip_code: str
     lat: float
@@ -24,16 +41,16 @@ class Location:
         return f"{self.zip_code}: {self.name}, {self.region}"
 
 
-@dataclass
+@dataclass(slots=True)
 class MetaStats:
     observed_hrs: int
     location: Location
 
 
-@dataclass
+@dataclass(slots=True)
 class GeneralStat(ABC):
     @staticmethod
-    def apply(df: pd.DataFrame) -> Any:
+    def apply(cols: HourlyColumns) -> Any:
         raise NotImplementedError()
 
     @property
@@ -42,11 +59,11 @@ class GeneralStat(ABC):
         raise NotImplementedError()
 
     @abstractmethod
-    def get_msg(self, meta: MetaStats) -> list[str]:
+    def get_msg(self, meta: MetaStats) -> str:
         raise NotImplementedError()
 
 
-@dataclass
+@dataclass(slots=True)
 class TimeStats(GeneralStat):
     observed_hrs: int
     from_time: datetime
@@ -55,38 +72,34 @@ class TimeStats(GeneralStat):
     sunrise: datetime
 
     @property
-    @overrides
     def name(self) -> Optional[str]:
         return None
 
-    @overrides
-    def get_msg(self, meta: MetaStats) -> list[str]:
-        msgs = [
-            f"🌡️ Weather Report for {meta.location} 🌡️",
-            f"Generated at: {datetime.now().strftime('%a, %b %d %Y @ %I:%M%p')}",
-            f"From: {self.from_time.isoformat()} to {self.to_time.isoformat()}",
-            "",
-        ]
-        msgs.append(f"🌅 Sunrise: {time_to_str(self.sunrise)}")
-        msgs.append(f"🌇 Sunset: {time_to_str(self.sunset)}")
-        return msgs
+    def get_msg(self, meta: MetaStats) -> str:
+        return (
+            f"🌡️ Weather Report for {meta.location} 🌡️\n"
+            f"Generated at: {datetime.now().strftime('%a, %b %d %Y @ %I:%M%p')}\n"
+            f"From: {self.from_time.isoformat()} to {self.to_time.isoformat()}\n"
+            "\n"
+            f"🌅 Sunrise: {time_to_str(self.sunrise)}\n"
+            f"🌇 Sunset: {time_to_str(self.sunset)}"
+        )
 
     @staticmethod
-    @overrides
-    def apply(df: pd.DataFrame) -> "TimeStats":
-        observed_hrs = (
-            int((df["time"].max() - df["time"].min()).total_seconds() / 60 / 60) + 1
-        )
+    def apply(cols: HourlyColumns) -> "TimeStats":
+        from_time = pd.Timestamp(cols.time.min())
+        to_time = pd.Timestamp(cols.time.max())
+        observed_hrs = int((to_time - from_time).total_seconds() / 60 / 60) + 1
         return TimeStats(
             observed_hrs=observed_hrs,
-            from_time=df["time"].min(),
-            to_time=df["time"].max(),
-            sunset=df["sunset"].max(),
-            sunrise=df["sunrise"].min(),
+            from_time=from_time,
+            to_time=to_time,
+            sunset=pd.Timestamp(cols.sunset.max()),
+            sunrise=pd.Timestamp(cols.sunrise.min()),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class TempStats(GeneralStat):
     min_temp: float
     min_temp_time: datetime
@@ -96,32 +109,30 @@ class TempStats(GeneralStat):
     avg_humidity: float
 
     @property
-    @overrides
     def name(self) -> Optional[str]:
         return "Temperatures"
 
-    @overrides
-    def get_msg(self, meta: MetaStats) -> list[str]:
-        msgs = []
-        msgs.append(f"⬇️ Lowest temp: {self.min_temp}F at {self.min_temp_time}")
-        msgs.append(f"⬆️ Highest temp: {self.max_temp}F at {self.max_temp_time}")
-        msgs.append(f"🦆 Average humidity: {self.avg_humidity:.1f}%")
-        return msgs
+    def get_msg(self, meta: MetaStats) -> str:
+        return (
+            f"⬇️ Lowest temp: {self.min_temp}F at {self.min_temp_time}\n"
+            f"⬆️ Highest temp: {self.max_temp}F at {self.max_temp_time}\n"
+            f"🦆 Average humidity: {self.avg_humidity:.1f}%"
+        )
 
     @staticmethod
-    @overrides
-    def apply(df: pd.DataFrame) -> "TempStats":
+    def apply(cols: HourlyColumns) -> "TempStats":
+        temps = cols.temp_f
         return TempStats(
-            min_temp=df["temp_f"].min(),
-            max_temp_time=df.loc[df["temp_f"] == df["temp_f"].max()].iloc[0]["time"],
-            max_temp=df["temp_f"].max(),
-            min_temp_time=df.loc[df["temp_f"] == df["temp_f"].min()].iloc[0]["time"],
-            avg_temp=df["temp_f"].mean(),
-            avg_humidity=df["humidity"].mean(),
+            min_temp=temps.min(),
+            max_temp_time=pd.Timestamp(cols.time[temps.argmax()]),
+            max_temp=temps.max(),
+            min_temp_time=pd.Timestamp(cols.time[temps.argmin()]),
+            avg_temp=temps.mean(),
+            avg_humidity=cols.humidity.mean(),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class RainStats(GeneralStat):
     has_rain: bool
     total_rain_mm: float
@@ -129,68 +140,64 @@ class RainStats(GeneralStat):
     rain_end_time: Optional[datetime]
 
     @property
-    @overrides
     def name(self) -> Optional[str]:
         return "Rainfall"
 
-    @overrides
-    def get_msg(self, meta: MetaStats) -> list[str]:
-        msgs = []
+    def get_msg(self, meta: MetaStats) -> str:
         if not self.has_rain:
-            msgs.append(f"🌵 No rain in the next {meta.observed_hrs} hours")
-        else:
-            msgs.append(f"⚠️ Total rain: {self.total_rain_mm:.2f}mm")
-            msgs.append(f"☔️ Rain starts: {self.rain_start_time}")  # type: ignore
-            msgs.append(f"☔️ Rain ends: {self.rain_end_time}")  # type: ignore
-        return msgs
+            return f"🌵 No rain in the next {meta.observed_hrs} hours"
+        return (
+            f"⚠️ Total rain: {self.total_rain_mm:.2f}mm\n"
+            f"☔️ Rain starts: {self.rain_start_time}\n"
+            f"☔️ Rain ends: {self.rain_end_time}"
+        )
 
     @staticmethod
-    @overrides
-    def apply(df: pd.DataFrame) -> "RainStats":
+    def apply(cols: HourlyColumns) -> "RainStats":
         # Rain
         rain_start_time = None
         rain_end_time = None
-        if df["precip_mm"].max() > 0:
-            rain_start_time = df.loc[df["precip_mm"] > 0]["time"].min()
-            rain_end_time = df.loc[df["precip_mm"] > 0]["time"].max()
+        rain_times = cols.time[cols.precip_mm > 0]
+        has_rain = len(rain_times) > 0
+        if has_rain:
+            rain_start_time = pd.Timestamp(rain_times.min())
+            rain_end_time = pd.Timestamp(rain_times.max())
 
         return RainStats(
-            has_rain=df["precip_mm"].max() > 0,
-            total_rain_mm=df["precip_mm"].sum(),
+            has_rain=has_rain,
+            total_rain_mm=cols.precip_mm.sum(),
             rain_start_time=rain_start_time,
             rain_end_time=rain_end_time,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class WindStats(GeneralStat):
     avg_wind_mph: float
     max_wind_mph: float
     max_wind_at: datetime
 
     @property
-    @overrides
     def name(self) -> Optional[str]:
         return "Wind"
 
-    @overrides
-    def get_msg(self, meta: MetaStats) -> list[str]:
-        msgs = []
-        msgs.append(f"🌬️ Average wind: {self.avg_wind_mph:.1f}mph")
-        msgs.append(f"🌬️ Max wind: {self.max_wind_mph:.1f}mph at {self.max_wind_at}")
-        return msgs
+    def get_msg(self, meta: MetaStats) -> str:
+        return (
+            f"🌬️ Average wind: {self.avg_wind_mph:.1f}mph\n"
+            f"🌬️ Max wind: {self.max_wind_mph:.1f}mph at {self.max_wind_at}"
+        )
 
     @staticmethod
-    @overrides
-    def apply(df: pd.DataFrame) -> "WindStats":
+    def apply(cols: HourlyColumns) -> "WindStats":
+        winds = cols.wind_mph
         return WindStats(
-            avg_wind_mph=df["wind_mph"].mean(),
-            max_wind_mph=df["wind_mph"].max(),
-            max_wind_at=df.loc[df["wind_mph"] == df["wind_mph"].max()].iloc[0]["time"],
+            avg_wind_mph=winds.mean(),
+            max_wind_mph=winds.max(),
+            max_wind_at=pd.Timestamp(cols.time[winds.argmax()]),
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class FreezingStats(GeneralStat):
     is_freezing: bool
     avg_low_during_freezing: Optional[float]
@@ -199,36 +206,25 @@ class FreezingStats(GeneralStat):
     first_safe_temp_time: Optional[datetime]
 
     @property
-    @overrides
     def name(self) -> Optional[str]:
         return "Frost"
 
-    @overrides
-    def get_msg(self, meta: MetaStats) -> list[str]:
-        msgs = []
+    def get_msg(self, meta: MetaStats) -> str:
         if not self.is_freezing:
-            msgs.append(f"✅ No freezing temps in the next {meta.observed_hrs} hours")
+            return f"✅ No freezing temps in the next {meta.observed_hrs} hours"
+        # Back to safety
+        if not self.first_safe_temp:
+            safety = f"🌤️ No safe temperatures in the next {meta.observed_hrs} hours!"
         else:
-            msgs.append(
-                f"⚠️ {self.freezing_hrs} hours of freezing temps in the next {meta.observed_hrs} hours! 🥶"
-            )
-            msgs.append(
-                f"❄️ Average low will be: {self.avg_low_during_freezing:.1f}F during that time!"
-            )
-            # Back to safety
-            if not self.first_safe_temp:
-                msgs.append(
-                    f"🌤️ No safe temperatures in the next {meta.observed_hrs} hours!"
-                )
-            else:
-                msgs.append(
-                    f"🌤️ Safe temperature of {self.first_safe_temp}F reached at {self.first_safe_temp_time}"
-                )
-        return msgs
+            safety = f"🌤️ Safe temperature of {self.first_safe_temp}F reached at {self.first_safe_temp_time}"
+        return (
+            f"⚠️ {self.freezing_hrs} hours of freezing temps in the next {meta.observed_hrs} hours! 🥶\n"
+            f"❄️ Average low will be: {self.avg_low_during_freezing:.1f}F during that time!\n"
+            f"{safety}"
+        )
 
     @staticmethod
-    @overrides
-    def apply(df: pd.DataFrame) -> "FreezingStats":
+    def apply(cols: HourlyColumns) -> "FreezingStats":
         # Some buffer between 33 and 32
         min_temp_f: float = 33.0
         # Defaults
@@ -236,30 +232,23 @@ class FreezingStats(GeneralStat):
         freezing_hrs = 0
         first_safe_temp = None
         first_safe_temp_time = None
-        # Calc
-        freezing_hrs_df = df.loc[df["temp_f"] <= min_temp_f]
-        is_freezing = len(freezing_hrs_df) > 0
+        # Calc, on the raw arrays; hours are sorted by time.
+        # Freezing at all iff the (first) coldest hour is freezing.
+        temps = cols.temp_f
+        coldest = int(temps.argmin())
+        is_freezing = bool(temps[coldest] <= min_temp_f)
         if is_freezing:
-            min_tmp_df = df.loc[df["temp_f"] == df["temp_f"].min()]
-            freezing_hrs_df = df.loc[
-                (df["temp_f"] <= min_temp_f)
-                & (df["time"] <= min_tmp_df.iloc[0]["time"])
-            ]
-            avg_low_during_freezing = freezing_hrs_df["temp_f"].mean()
-            freezing_hrs = len(freezing_hrs_df)
-            safe_temps_reached_df = df.loc[
-                (df["temp_f"] >= min_temp_f)
-                & (df["time"] >= min_tmp_df.iloc[0]["time"])
-            ]
-            first_safe_temp_df = safe_temps_reached_df.loc[
-                safe_temps_reached_df["time"] == safe_temps_reached_df["time"].min()
-            ]
-            if len(first_safe_temp_df) > 1:
-                first_safe_temp = first_safe_temp_df["temp_f"]
-                first_safe_temp_time = first_safe_temp_df["time"]
-            else:
-                first_safe_temp = None
-                first_safe_temp_time = None
+            # Up to and including the coldest hour
+            until_coldest = temps[: coldest + 1]
+            freezing_until_coldest = until_coldest[until_coldest <= min_temp_f]
+            avg_low_during_freezing = freezing_until_coldest.mean()
+            freezing_hrs = len(freezing_until_coldest)
+            # First safe hour after that; argmax is 0 for both "first" and "none"
+            safe_after_coldest = temps[coldest:] >= min_temp_f
+            offset = int(safe_after_coldest.argmax())
+            if safe_after_coldest[offset]:
+                first_safe_temp = temps[coldest + offset]
+                first_safe_temp_time = pd.Timestamp(cols.time[coldest + offset])
 
         return FreezingStats(
             is_freezing=is_freezing,
@@ -270,20 +259,69 @@ class FreezingStats(GeneralStat):
         )
 
 
-@dataclass
-class SummaryStat(TimeStats, TempStats, RainStats, WindStats, FreezingStats):
+@dataclass(slots=True)
+class SummaryStat:
+    # All stats, flattened. Slotted classes can't be combined through
+    # multiple inheritance, so every stat's fields are repeated here.
+    # TimeStats
+    observed_hrs: int
+    from_time: datetime
+    to_time: datetime
+    sunset: datetime
+    sunrise: datetime
+    # TempStats
+    min_temp: float
+    min_temp_time: datetime
+    max_temp: float
+    max_temp_time: datetime
+    avg_temp: float
+    avg_humidity: float
+    # RainStats
+    has_rain: bool
+    total_rain_mm: float
+    rain_start_time: Optional[datetime]
+    rain_end_time: Optional[datetime]
+    # WindStats
+    avg_wind_mph: float
+    max_wind_mph: float
+    max_wind_at: datetime
+    # FreezingStats
+    is_freezing: bool
+    avg_low_during_freezing: Optional[float]
+    freezing_hrs: int
+    first_safe_temp: Optional[float]
+    first_safe_temp_time: Optional[datetime]
+
+    @staticmethod
+    def apply(cols: HourlyColumns) -> "SummaryStat":
+        return SummaryStat.from_stats(
+            time=TimeStats.apply(cols),
+            temp=TempStats.apply(cols),
+            rain=RainStats.apply(cols),
+            wind=WindStats.apply(cols),
+            freezing=FreezingStats.apply(cols),
+        )
+
     @staticmethod
-    def apply(df: pd.DataFrame) -> "SummaryStat":
+    def from_stats(
+        time: TimeStats,
+        temp: TempStats,
+        rain: RainStats,
+        wind: WindStats,
+        freezing: FreezingStats,
+    ) -> "SummaryStat":
+        """Merges already computed stats, without scanning the data again"""
+        # Shallow copy; asdict() would deep-copy every value first
         return SummaryStat(
-            **asdict(TimeStats.apply(df)),
-            **asdict(TempStats.apply(df)),
-            **asdict(RainStats.apply(df)),
-            **asdict(WindStats.apply(df)),
-            **asdict(FreezingStats.apply(df)),
+            **{
+                f.name: getattr(stat, f.name)
+                for stat in (time, temp, rain, wind, freezing)
+                for f in fields(stat)
+            }
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class WeatherStats:
     time: TimeStats
     temp: TempStats
@@ -293,21 +331,16 @@ class WeatherStats:
     meta: MetaStats
     all: SummaryStat
 
-    def build_msgs(self) -> list[str]:
-        msgs = []
+    def build_msgs(self) -> str:
+        sections = []
         for stat in [self.time, self.temp, self.rain, self.wind, self.freezing]:
             header = stat.name
-            if header:
-                msgs.append(f"## {header}")
-            msgs.extend(stat.get_msg(self.meta))
-            msgs.append("")
-        return msgs
+            msg = stat.get_msg(self.meta)
+            sections.append(f"## {header}\n{msg}" if header else msg)
+        return "\n\n".join(sections) + "\n"
 
     @staticmethod
     def apply(df: pd.DataFrame, raw: WeatherData, zip_code: str) -> "WeatherStats":
-        observed_hrs = (
-            int((df["time"].max() - df["time"].min()).total_seconds() / 60 / 60) + 1
-        )
         location = Location(
             zip_code=zip_code,
             lat=raw["location"]["lat"],
@@ -317,12 +350,19 @@ class WeatherStats:
             country=raw["location"]["country"],
             tz_id=raw["location"]["tz_id"],
         )
+        # Every stat scans the data exactly once; the summary reuses them
+        cols = HourlyColumns.from_df(df)
+        time = TimeStats.apply(cols)
+        temp = TempStats.apply(cols)
+        rain = RainStats.apply(cols)
+        wind = WindStats.apply(cols)
+        freezing = FreezingStats.apply(cols)
         return WeatherStats(
-            time=TimeStats.apply(df),
-            temp=TempStats.apply(df),
-            rain=RainStats.apply(df),
-            wind=WindStats.apply(df),
-            freezing=FreezingStats.apply(df),
-            meta=MetaStats(observed_hrs=observed_hrs, location=location),
-            all=SummaryStat.apply(df),
+            time=time,
+            temp=temp,
+            rain=rain,
+            wind=wind,
+            freezing=freezing,
+            meta=MetaStats(observed_hrs=time.observed_hrs, location=location),
+            all=SummaryStat.from_stats(time, temp, rain, wind, freezing),
         )
@@ -1,119 +1,134 @@
+import io
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Optional
+
+import matplotlib.dates as mdates
 import pandas as pd
-import plotly.graph_objects as go
-from model.stats import WeatherStats
-from plotly.subplots import make_subplots
+from matplotlib.figure import Figure
+from model.stats import HourlyColumns, WeatherStats
 from utils import time_to_str
 
+RENDER_CACHE_MAX_SIZE = 16
+_render_cache: OrderedDict[bytes, bytes] = OrderedDict()
+# Renders run in worker threads, one per ZIP
+_render_cache_lock = threading.Lock()
 
-def plot_weather(hourly: pd.DataFrame, st: WeatherStats) -> go.Figure:
-    dt_str = list(pd.to_datetime(hourly["time"]).dt.date.unique())[0].strftime(
-        "%A, %B %d, %Y"
-    )
+
+def plot_weather(
+    hourly: pd.DataFrame, st: WeatherStats, cols: Optional[HourlyColumns] = None
+) -> Figure:
+    if cols is None:
+        cols = HourlyColumns.from_df(hourly)
+
+    dt_str = pd.Timestamp(cols.time[0]).strftime("%A, %B %d, %Y")
     heading = f"Weather in {st.meta.location}"
     subtitle = f"{dt_str} from {time_to_str(st.time.from_time)} to {time_to_str(st.time.to_time)}"
-    title = f"{heading}<br><sup>{subtitle}</sup>"
 
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    # Figure() w/o pyplot: no global state, safe to render off the main thread
+    fig = Figure(figsize=(10, 6), dpi=100, layout="constrained")
+    ax = fig.add_subplot()
+    ax2 = ax.twinx()
 
     # Humidity / Rain
     if st.rain.has_rain:
-        fig.add_trace(
-            go.Bar(
-                x=hourly["time"],
-                y=hourly["precip_mm"],
-                name="Rainfall (mm)",
-                marker=dict(color="blue", opacity=0.5),
-            ),
-            secondary_y=True,
+        ax2.bar(
+            cols.time,
+            cols.precip_mm,
+            width=1 / 24 * 0.8,
+            label="Rainfall (mm)",
+            color="blue",
+            alpha=0.5,
         )
-        fig.update_yaxes(title_text="<b>Rainfall</b> (mm)", secondary_y=True)
+        ax2.set_ylabel("Rainfall (mm)", fontweight="bold")
     else:
-        fig.add_trace(
-            go.Scatter(
-                x=hourly["time"],
-                y=hourly["humidity"],
-                name="Humidity",
-                opacity=0.5,
-                line=dict(color="blue"),
-            ),
-            secondary_y=True,
-        )
-        fig.update_yaxes(
-            title_text="<b>Humidity</b> (%)", secondary_y=True, range=[20, 100]
+        ax2.plot(
+            cols.time,
+            cols.humidity,
+            label="Humidity",
+            color="blue",
+            alpha=0.5,
         )
+        ax2.set_ylabel("Humidity (%)", fontweight="bold")
+        ax2.set_ylim(20, 100)
 
     # Temp
-    fig.add_trace(
-        go.Scatter(
-            x=hourly["time"],
-            y=hourly["temp_f"],
-            name="Temp (F)",
-            line=dict(color="darkred"),
-        ),
-        secondary_y=False,
-    )
-    fig.add_trace(
-        go.Scatter(
-            x=hourly["time"],
-            y=hourly["feelslike_f"],
-            name="Feels like (F)",
-            line=dict(color="red", dash="dot"),
-        ),
-        secondary_y=False,
+    ax.plot(cols.time, cols.temp_f, label="Temp (F)", color="darkred")
+    ax.plot(
+        cols.time,
+        cols.feelslike_f,
+        label="Feels like (F)",
+        color="red",
+        linestyle=":",
     )
     # Freezing
-    hourly["freezing"] = 32.0
-    fig.add_trace(
-        go.Scatter(
-            x=hourly["time"],
-            y=hourly["freezing"],
-            name="Freezing Point",
-            opacity=0.5,
-            line=dict(color="red"),
-        ),
-        secondary_y=False,
-    )
-    hourly["danger_zone"] = 34.00
-    fig.add_trace(
-        go.Scatter(
-            x=hourly["time"],
-            y=hourly["danger_zone"],
-            name="Danger Zone",
-            opacity=0.5,
-            line=dict(color="orange"),
-        ),
-        secondary_y=False,
-    )
+    ax.axhline(32.0, label="Freezing Point", color="red", alpha=0.5)
+    ax.axhline(34.00, label="Danger Zone", color="orange", alpha=0.5)
 
     # Sunset/Sunrise
-    fig.add_vline(
-        x=hourly["sunset"].min().to_pydatetime(),
-        line_width=1.5,
-        line_color="#FFC000",
-        line_dash="dash",
-    )
-    fig.add_annotation(
-        x=hourly["sunset"].min(),
-        y=hourly["temp_f"].max() + 5,
-        text="Sunset",
-        showarrow=False,
+    ax.axvline(x=cols.sunset.min(), linewidth=1.5, color="#FFC000", linestyle="--")
+    ax.annotate(
+        "Sunset",
+        xy=(cols.sunset.min(), cols.temp_f.max() + 5),
+        ha="center",
     )
-    fig.add_vline(
-        x=hourly["sunrise"].max(),
-        line_width=1.5,
-        line_color="#FCF55F",
-        line_dash="dash",
-    )
-    fig.add_annotation(
-        x=hourly["sunrise"].min(),
-        y=hourly["temp_f"].max() + 5,
-        text="Sunrise",
-        showarrow=False,
+    ax.axvline(x=cols.sunrise.max(), linewidth=1.5, color="#FCF55F", linestyle="--")
+    ax.annotate(
+        "Sunrise",
+        xy=(cols.sunrise.min(), cols.temp_f.max() + 5),
+        ha="center",
     )
+    ax.set_ylim(top=cols.temp_f.max() + 8)
 
-    fig.update_layout(title_text=title)
+    fig.suptitle(heading)
+    ax.set_title(subtitle, fontsize="small")
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
 
     # Set y-axes titles
-    fig.update_yaxes(title_text="<b>Temperature</b> (F)", secondary_y=False)
+    ax.set_ylabel("Temperature (F)", fontweight="bold")
+
+    handles, labels = ax.get_legend_handles_labels()
+    handles2, labels2 = ax2.get_legend_handles_labels()
+    fig.legend(
+        handles + handles2, labels + labels2, loc="outside right upper", frameon=False
+    )
 
     return fig
+
+
+def render_png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def render_weather(hourly: pd.DataFrame, st: WeatherStats) -> bytes:
+    """Renders the chart to PNG, reusing the last renders for identical data
+
+    Args:
+        hourly (pd.DataFrame): Hourly data
+        st (WeatherStats): Stats
+
+    Returns:
+        bytes: PNG
+    """
+    cols = HourlyColumns.from_df(hourly)
+    h = blake2b(str(st.meta.location).encode(), digest_size=16)
+    for col in cols:
+        h.update(col.tobytes())
+    key = h.digest()
+    with _render_cache_lock:
+        png = _render_cache.get(key)
+        if png is not None:
+            _render_cache.move_to_end(key)
+            return png
+    # Rendering itself stays outside the lock so ZIPs still render in parallel
+    png = render_png(plot_weather(hourly, st, cols))
+    with _render_cache_lock:
+        _render_cache[key] = png
+        if len(_render_cache) > RENDER_CACHE_MAX_SIZE:
+            _render_cache.popitem(last=False)
+    return png